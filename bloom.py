@@ -0,0 +1,78 @@
+# coding=utf-8
+import hashlib
+import math
+from typing import Dict
+
+# sizes Solver.approximate_bfs uses unless told otherwise
+default_capacity = 1000000
+default_error_rate = 0.001
+default_recent = 10000
+
+
+class BloomFilter:
+	# Sized for capacity items at the given false positive rate
+	def __init__(self, capacity: int, error_rate=default_error_rate):
+		self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+		self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+		self.bits = bytearray((self.size + 7) // 8)
+		self.count = 0
+
+	def get_indexes(self, data: bytes):
+		# double hashing: the i-th index is h1 + i * h2
+		digest = hashlib.blake2b(data, digest_size=16).digest()
+		first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+		return [(first + i * second) % self.size for i in range(self.hashes)]
+
+	def add(self, data: bytes):
+		for index in self.get_indexes(data):
+			self.bits[index >> 3] |= 1 << (index & 7)
+		self.count += 1
+
+	def __contains__(self, data: bytes):
+		return all(self.bits[index >> 3] >> (index & 7) & 1 for index in self.get_indexes(data))
+
+	@property
+	def error_rate(self):
+		# expected false positive rate with the current number of items
+		return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class ApproximateVisited:
+	# Drop-in for State.visited: the most recent states are kept exactly, everything else only in
+	# a Bloom filter. A false positive there prunes a new state; only a query the exact set cannot
+	# answer can be one, with the filter's false positive rate at that moment.
+	def __init__(self, capacity=default_capacity, error_rate=default_error_rate, recent=default_recent):
+		self.filter = BloomFilter(capacity, error_rate)
+		self.recent: Dict[bytes, None] = {}
+		self.recent_size = recent
+		self.expected_pruned = 0.0
+
+	@staticmethod
+	def encode(key):
+		return repr(key).encode()
+
+	def __len__(self):
+		return self.filter.count
+
+	def __contains__(self, key):
+		data = self.encode(key)
+		if data in self.recent:
+			return True
+		self.expected_pruned += self.filter.error_rate
+		return data in self.filter
+
+	def append(self, key):
+		data = self.encode(key)
+		self.filter.add(data)
+		self.recent[data] = None
+		if len(self.recent) > self.recent_size:
+			del self.recent[next(iter(self.recent))]
+
+	@property
+	def miss_probability(self):
+		# union bound over the queries that reached the filter, whether they were new or not
+		return min(1.0, self.expected_pruned)
+
+	@property
+	def memory(self):
+		return len(self.filter.bits) + sum(len(data) for data in self.recent)
@@ -0,0 +1,163 @@
+# coding=utf-8
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from bloom import BloomFilter, default_capacity, default_error_rate, default_recent
+from game_state import Stage, get_direction, is_goal, pack, successors, unpack
+from solver import default_table_size
+from state import State
+from transition import TransitionTable
+from utility import Direction
+
+
+def get_size(value):
+	# deep size of the containers only: strings and small ints of the keys are shared objects
+	if isinstance(value, (list, tuple)):
+		return sys.getsizeof(value) + sum(get_size(item) for item in value)
+	if isinstance(value, dict):
+		return sys.getsizeof(value) + sum(get_size(key) + get_size(item) for key, item in value.items())
+	return 0
+
+
+def get_capacity(count: int, minimum: int):
+	capacity = minimum
+	while capacity < count:
+		capacity *= 2
+	return capacity
+
+
+class Census:
+	# Every state reachable from the start of a stage, found by a Breadth First Search over packed
+	# GameStates. Goal states end the stage, so like in the solvers they are not expanded.
+	def __init__(self, number: int):
+		self.number = number
+		self.state = State(stage=number)
+		self.stage = Stage.from_state(self.state)
+		self.depths: List[int] = []
+		self.goal_depth: Optional[int] = None
+		self.masks = set()
+		self.configs = set()
+		self.edges = 0
+		self.count()
+
+	def count(self):
+		start = pack(self.stage, self.stage.start)
+		visited = {start}
+		frontier = [start]
+		while frontier:
+			self.depths.append(len(frontier))
+			layer = []
+			for key in frontier:
+				self.masks.add(key & ((1 << self.stage.bridge_count) - 1))
+				self.configs.add(key >> self.stage.bridge_count)
+				node = unpack(self.stage, key)
+				if is_goal(self.stage, node):
+					if self.goal_depth is None:
+						self.goal_depth = len(self.depths) - 1
+					continue
+				for _, child in successors(self.stage, node):
+					self.edges += 1
+					child = pack(self.stage, child)
+					if child not in visited:
+						visited.add(child)
+						layer.append(child)
+			frontier = layer
+
+	@property
+	def states(self):
+		return sum(self.depths)
+
+	@property
+	def states_to_goal(self):
+		# what the searches that stop at the goal hold at most
+		if self.goal_depth is None:
+			return self.states
+		return sum(self.depths[:self.goal_depth + 1])
+
+	# Estimated bytes per back end of main.Method, from the sizes of this stage's own keys
+	def memory(self, capacity=default_capacity, error_rate=default_error_rate) -> Dict[str, int]:
+		found, width = self.states_to_goal, max(self.depths)
+		data = (self.state.player.tolist(), self.state.get_bridges_status(self.state.board))
+		# State.visited and State.states share the data tuple, each list adds a pointer
+		state_lists = self.states * (get_size(data) + 16)
+
+		key = (tuple(self.state.player.flatten().tolist()), tuple(data[1]))
+		table = min(self.states, default_table_size)
+		iterative = sys.getsizeof(OrderedDict.fromkeys(range(table))) + table * get_size(key)
+
+		size = TransitionTable(self.state, build=False).size
+		degree = self.edges / max(self.states, 1)
+		# successors (int32 x 5), goal, distances (uint16), offsets (int64) and sources (int32)
+		distance = int(size * (20 + 1 + 2 + 8 + 4 * degree))
+
+		packed = pack(self.stage, self.stage.start)
+		shards = sys.getsizeof(dict.fromkeys(range(found))) + found * (2 * sys.getsizeof(packed * 8))
+		# (child, parent * 8 + action) rows of one layer, in segments allocated twice that size
+		mailbox = width * 5 * 16 * 2
+		compiled = get_capacity(found, 1024) * 17 + get_capacity(2 * found + 1, 2048) * 8
+
+		# the filter is sized for its capacity whatever the stage, and once visited only the frontier
+		# in State.states keeps its data
+		bloom = len(BloomFilter(capacity, error_rate).bits)
+		recent = min(found, default_recent)
+		recent = sys.getsizeof(dict.fromkeys(range(recent))) + recent * sys.getsizeof(repr(data).encode())
+		return {
+			'breadth_first_search': found * (get_size(data) + 16),
+			'depth_first_search': state_lists,
+			'distance_map': distance,
+			'iterative_deepening': iterative,
+			'parallel_breadth_first_search': shards + mailbox,
+			'compiled_breadth_first_search': compiled,
+			'approximate_breadth_first_search': width * (get_size(data) + 8) + bloom + recent,
+		}
+
+	def to_dict(self, capacity=default_capacity, error_rate=default_error_rate):
+		return {
+			'stage': self.number,
+			'width': self.stage.width,
+			'height': self.stage.height,
+			'states': self.states,
+			'states_to_goal': self.states_to_goal,
+			'configurations': len(self.configs),
+			'edges': self.edges,
+			'goal_depth': self.goal_depth,
+			'max_depth': len(self.depths) - 1,
+			'depths': self.depths,
+			'bridges': self.stage.bridge_count,
+			'bridge_masks': {'theoretical': 1 << self.stage.bridge_count, 'reachable': len(self.masks)},
+			'split_configurations': sum(get_direction(unpack(self.stage, config << self.stage.bridge_count).player)
+										== Direction.none for config in self.configs),
+			'memory': self.memory(capacity, error_rate),
+		}
+
+
+def get_stages(folder='Stages'):
+	paths = glob.glob(os.path.join(folder, 'stage_*.txt'))
+	return sorted(int(re.search(r'stage_(\d+)', path).group(1)) for path in paths)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Reachable states and memory estimates of Bloxorz stages')
+	parser.add_argument('stages', type=int, nargs='*', help='stage numbers, every stage when omitted')
+	parser.add_argument('--capacity', type=int, default=default_capacity,
+						help='states the Bloom filter of approximate_breadth_first_search is sized for')
+	parser.add_argument('--error-rate', type=float, default=default_error_rate,
+						help='false positive rate of that filter at full capacity')
+	parser.add_argument('--output', help='JSON file to write, standard output when omitted')
+	arguments = parser.parse_args()
+
+	report = [Census(number).to_dict(arguments.capacity, arguments.error_rate)
+			  for number in arguments.stages or get_stages()]
+	if arguments.output:
+		with open(arguments.output, 'w') as file:
+			json.dump(report, file, indent=2)
+		print('Wrote the census of {} stages to {}'.format(len(report), arguments.output))
+	else:
+		json.dump(report, sys.stdout, indent=2)
+		print()
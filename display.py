@@ -54,6 +54,9 @@ class Display:
 		glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 		glViewport(0, 0, self.surface.get_width(), self.surface.get_height())
 
+	def set_status(self, status=None):
+		pygame.display.set_caption(self.title if not status else '{} - {}'.format(self.title, status))
+
 	@staticmethod
 	def is_trying_to_quit(event):
 		pressed_keys = pygame.key.get_pressed()
@@ -0,0 +1,183 @@
+# coding=utf-8
+import heapq
+from collections import deque
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from state import State
+from transition import TransitionTable, actions
+
+unreachable = np.iinfo(np.uint16).max
+
+
+class DistanceMap:
+	# Exact number of moves to the goal for every packed state of a stage,
+	# found with one backward Breadth First Search from all goal states
+	def __init__(self, table: TransitionTable):
+		self.table = table
+		self.distances = self.build(table)
+
+	@classmethod
+	def from_state(cls, state: State):
+		return cls(TransitionTable(state))
+
+	@staticmethod
+	def build(table: TransitionTable):
+		distances = np.full(table.size, unreachable, dtype=np.uint16)
+		sources, offsets = table.predecessors()
+
+		queue = deque(np.flatnonzero(table.goal).tolist())
+		distances[table.goal] = 0
+		while queue:
+			key = queue.popleft()
+			depth = distances[key] + 1
+			for previous in sources[offsets[key]:offsets[key + 1]].tolist():
+				if distances[previous] == unreachable:
+					distances[previous] = depth
+					queue.append(previous)
+		return distances
+
+	# Follows an edit of the stage: carries the old distances over, then only fixes the states around
+	# the recomputed rows. Returns the number of recomputed rows, or None after a full rebuild.
+	def update(self, state: State):
+		result = self.table.update(state)
+		if result is None:
+			self.table = TransitionTable(state)
+			self.distances = self.build(self.table)
+			return None
+
+		old_keys, recomputed = result
+		distances = np.where(old_keys >= 0, self.distances[np.maximum(old_keys, 0)], unreachable)
+		self.distances = distances.astype(np.uint16)
+		self.repair(recomputed.tolist())
+		return len(recomputed)
+
+	def repair(self, changed: List[int]):
+		table, distances = self.table, self.distances
+		sources, offsets = table.predecessors()
+
+		def supported(key: int, depth: int):
+			if depth == 0:
+				return bool(table.goal[key])
+			return any(target >= 0 and distances[target] == depth - 1 and target not in lost
+					   for target in table.successors[key].tolist())
+
+		# states whose distance relied on a removed move lose it, in order of distance so a
+		# state is only checked once everything closer to the goal is settled
+		lost = set()
+		heap = [(int(distances[key]), key) for key in changed if distances[key] != unreachable]
+		heapq.heapify(heap)
+		while heap:
+			depth, key = heapq.heappop(heap)
+			if key in lost or supported(key, depth):
+				continue
+			lost.add(key)
+			for previous in sources[offsets[key]:offsets[key + 1]].tolist():
+				if distances[previous] == depth + 1:
+					heapq.heappush(heap, (depth + 1, previous))
+		for key in lost:
+			distances[key] = unreachable
+
+		# then distances are lowered again backwards from the lost and recomputed states
+		heap = []
+		for key in lost | set(changed):
+			if table.goal[key]:
+				depth = 0
+			else:
+				depth = min([int(distances[target]) + 1 for target in table.successors[key].tolist()
+							 if target >= 0 and distances[target] != unreachable], default=unreachable)
+			if depth < distances[key]:
+				distances[key] = depth
+				heapq.heappush(heap, (depth, key))
+		while heap:
+			depth, key = heapq.heappop(heap)
+			if depth != distances[key]:
+				continue
+			for previous in sources[offsets[key]:offsets[key + 1]].tolist():
+				if depth + 1 < distances[previous]:
+					distances[previous] = depth + 1
+					heapq.heappush(heap, (depth + 1, previous))
+
+	def distance(self, player: np.ndarray, board: np.ndarray) -> Optional[int]:
+		value = int(self.distances[self.table.pack(player, board)])
+		return None if value == unreachable else value
+
+	def best_action(self, key: int) -> Optional[str]:
+		depth = self.distances[key]
+		if depth == 0 or depth == unreachable:
+			return None
+		for column, target in enumerate(self.table.successors[key]):
+			if target >= 0 and self.distances[target] == depth - 1:
+				return actions[column]
+
+	def next_action(self, player: np.ndarray, board: np.ndarray) -> Optional[str]:
+		return self.best_action(self.table.pack(player, board))
+
+	# Optimal path by following decreasing distances
+	def path(self, key: Optional[int] = None) -> Optional[List[str]]:
+		key = self.table.start if key is None else key
+		if self.distances[key] == unreachable:
+			return None
+		path = []
+		while self.distances[key] != 0:
+			action = self.best_action(key)
+			path.append(action)
+			key = self.table.successors[key, actions.index(action)]
+		return path
+
+	# Every optimal path, lazily, following only moves that bring the goal one step closer
+	def optimal_paths(self, key: Optional[int] = None) -> Iterator[List[str]]:
+		key = self.table.start if key is None else key
+		if self.distances[key] == unreachable:
+			return
+		path = []
+		stack = [iter(self.closer(key))]
+		while stack:
+			step = next(stack[-1], None)
+			if step is None:
+				stack.pop()
+				if path:
+					path.pop()
+				continue
+			action, target = step
+			path.append(action)
+			if self.distances[target] == 0:
+				yield list(path)
+				path.pop()
+			else:
+				stack.append(iter(self.closer(target)))
+
+	def closer(self, key: int):
+		depth = self.distances[key] - 1
+		return [(action, target) for action, target in self.table.next_states(key) if self.distances[target] == depth]
+
+	# Paths without repeated states in order of length, the optimal ones first. The distances are
+	# exact remaining costs, so a partial path's length plus its distance is the shortest it can end up
+	def shortest_paths(self, key: Optional[int] = None) -> Iterator[List[str]]:
+		key = self.table.start if key is None else key
+		if self.distances[key] == unreachable:
+			return
+		order = 0
+		# (length + distance, tie breaker, length, key, (action, parent node) chain)
+		heap = [(int(self.distances[key]), order, 0, key, None)]
+		while heap:
+			_, _, length, key, node = heapq.heappop(heap)
+			if self.distances[key] == 0:
+				path = []
+				while node is not None:
+					action, _, node = node
+					path.append(action)
+				yield path[::-1]
+				continue
+
+			on_path = {key}
+			parent = node
+			while parent is not None:
+				on_path.add(parent[1])
+				parent = parent[2]
+			for action, target in self.table.next_states(key):
+				if target in on_path or self.distances[target] == unreachable:
+					continue
+				order += 1
+				heapq.heappush(heap, (length + 1 + int(self.distances[target]), order, length + 1, target, (action, key, node)))
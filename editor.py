@@ -0,0 +1,50 @@
+# coding=utf-8
+import os
+import sys
+import time
+
+from distance import DistanceMap
+from state import State
+
+
+def report(stage: int, distance_map: DistanceMap, recomputed, total: float):
+	path = distance_map.path()
+	moves = 'unsolvable' if path is None else '{} moves'.format(len(path))
+	rows = 'full rebuild' if recomputed is None else '{}/{} states recomputed'.format(recomputed, distance_map.table.size)
+	print('Stage {0}: {1} ({2}, {3:.3f} ms)'.format(stage, moves, rows, total))
+
+
+# Re-solves a stage every time its file is saved, repairing the previous result where possible
+def watch(stage: int, interval=0.2):
+	path = 'Stages/stage_{}.txt'.format(stage)
+	start = time.perf_counter()
+	distance_map = DistanceMap.from_state(State(stage=stage))
+	report(stage, distance_map, None, (time.perf_counter() - start) * 1000)
+
+	modified = os.path.getmtime(path)
+	while True:
+		time.sleep(interval)
+		try:
+			changed = os.path.getmtime(path)
+		except OSError:
+			# some editors save by deleting the file and writing it again
+			continue
+		if changed == modified:
+			continue
+		modified = changed
+
+		start = time.perf_counter()
+		try:
+			recomputed = distance_map.update(State(stage=stage))
+		except (OSError, ValueError, IndexError, KeyError, SystemExit) as error:
+			# half-written or malformed file, wait for the next save
+			print('Stage {0}: could not load ({1})'.format(stage, error))
+			continue
+		report(stage, distance_map, recomputed, (time.perf_counter() - start) * 1000)
+
+
+if __name__ == '__main__':
+	try:
+		watch(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,202 @@
+# coding=utf-8
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from state import State
+from utility import Direction, Tile, actions
+
+Cell = Tuple[int, int]
+
+# (first block, second block) offsets of every move, the same as State.try_move
+moves = {
+	Direction.standing: {
+		'up': ((0, -2), (0, -1)), 'down': ((0, 1), (0, 2)), 'left': ((-2, 0), (-1, 0)), 'right': ((1, 0), (2, 0))},
+	Direction.laying_x: {
+		'up': ((0, -1), (0, -1)), 'down': ((0, 1), (0, 1)), 'left': ((-1, 0), (-2, 0)), 'right': ((2, 0), (1, 0))},
+	Direction.laying_y: {
+		'up': ((0, -1), (0, -2)), 'down': ((0, 2), (0, 1)), 'left': ((-1, 0), (-1, 0)), 'right': ((1, 0), (1, 0))},
+	Direction.none: {
+		'up': ((0, -1), (0, 0)), 'down': ((0, 1), (0, 0)), 'left': ((-1, 0), (0, 0)), 'right': ((1, 0), (0, 0))},
+}
+
+
+class GameState:
+	# Position of both halves plus the on/off bit of every bridge (bit i = i-th bridge of State.bridges)
+	__slots__ = ('player', 'mask')
+
+	def __init__(self, player: Tuple[Cell, Cell], mask: int):
+		object.__setattr__(self, 'player', player)
+		object.__setattr__(self, 'mask', mask)
+
+	def __setattr__(self, key, value):
+		raise AttributeError('GameState is immutable')
+
+	def __eq__(self, other):
+		return isinstance(other, GameState) and self.player == other.player and self.mask == other.mask
+
+	def __hash__(self):
+		return hash((self.player, self.mask))
+
+	def __repr__(self):
+		return 'GameState(player={}, mask={:b})'.format(self.player, self.mask)
+
+	def __reduce__(self):
+		return GameState, (self.player, self.mask)
+
+
+class Stage:
+	# Everything about a level that never changes during play, without State's rendering fields
+	__slots__ = ('width', 'height', 'floor', 'soft', 'goal', 'bridge_count', 'bridge_bits', 'switches', 'start')
+
+	def __init__(self, width: int, height: int, floor: FrozenSet[Cell], soft: FrozenSet[Cell], goal: FrozenSet[Cell],
+				 bridge_count: int, bridge_bits: Dict[Cell, int], switches: Dict[Cell, tuple], start: GameState):
+		self.width = width
+		self.height = height
+		self.floor = floor
+		self.soft = soft
+		self.goal = goal
+		self.bridge_count = bridge_count
+		self.bridge_bits = bridge_bits
+		self.switches = switches
+		self.start = start
+
+	@staticmethod
+	def get_mask(state: State):
+		mask = 0
+		for bit, (key, status) in enumerate(state.get_bridges_status(state.board)):
+			if status == 'B':
+				mask |= 1 << bit
+		return mask
+
+	@classmethod
+	def from_state(cls, state: State):
+		height, width = state.board.shape
+		bits = {key: bit for bit, key in enumerate(state.bridges)}
+		bridge_bits = {tuple(pos): bits[key] for key, positions in state.bridges.items() for pos in positions}
+		floor, soft, goal = set(), set(), set()
+		for y in range(height):
+			for x in range(width):
+				tile = str(state.board[y, x])
+				if tile != Tile.empty and (x, y) not in bridge_bits:
+					floor.add((x, y))
+				if tile == Tile.soft_floor:
+					soft.add((x, y))
+				elif tile == Tile.goal:
+					goal.add((x, y))
+
+		switches = {}
+		for cell, features in state.switches.items():
+			effects = []
+			for feature in features:
+				if feature[0] == 't':
+					effects.append(('t', tuple(tuple(block) for block in state.teleporter[feature])))
+				else:
+					effects.append((feature[0], int(feature[1]), bits[feature[2]]))
+			switches[cell] = tuple(effects)
+
+		start = GameState(tuple(tuple(block) for block in state.player.tolist()), cls.get_mask(state))
+		return cls(
+				width, height, frozenset(floor), frozenset(soft), frozenset(goal), len(bits), bridge_bits, switches, start)
+
+	@classmethod
+	def load(cls, number: int):
+		return cls.from_state(State(stage=number))
+
+
+# A GameState as one integer: ((cell of first half * cells + cell of second half) << bridges) | mask
+def pack(stage: Stage, game_state: GameState) -> int:
+	(x1, y1), (x2, y2) = game_state.player
+	cells = stage.width * stage.height
+	return ((y1 * stage.width + x1) * cells + y2 * stage.width + x2) << stage.bridge_count | game_state.mask
+
+
+def unpack(stage: Stage, key: int) -> GameState:
+	cells = stage.width * stage.height
+	config, mask = key >> stage.bridge_count, key & ((1 << stage.bridge_count) - 1)
+	(y1, x1), (y2, x2) = divmod(config // cells, stage.width), divmod(config % cells, stage.width)
+	return GameState(((x1, y1), (x2, y2)), mask)
+
+
+def get_direction(player: Tuple[Cell, Cell]):
+	(x1, y1), (x2, y2) = player
+	dx, dy = x2 - x1, y2 - y1
+	if dx == 0 and dy == 0:
+		return Direction.standing
+	elif (dx == 1 or dx == -1) and dy == 0:
+		return Direction.laying_x
+	elif (dy == 1 or dy == -1) and dx == 0:
+		return Direction.laying_y
+	return Direction.none
+
+
+def is_floor(stage: Stage, cell: Cell, mask: int):
+	if cell in stage.floor:
+		return True
+	bit = stage.bridge_bits.get(cell)
+	return bit is not None and mask >> bit & 1 == 1
+
+
+def is_valid(stage: Stage, player: Tuple[Cell, Cell], mask: int):
+	block1, block2 = player
+	if not is_floor(stage, block1, mask) or not is_floor(stage, block2, mask):
+		return False
+	return block1 != block2 or block1 not in stage.soft
+
+
+def is_goal(stage: Stage, game_state: GameState):
+	block1, block2 = game_state.player
+	return block1 == block2 and block1 in stage.goal
+
+
+def activate_bridge(mask: int, mode: int, bit: int):
+	if mode == 0:
+		return mask | 1 << bit
+	elif mode == 1:
+		return mask ^ 1 << bit
+	return mask & ~(1 << bit)
+
+
+def check_switch(stage: Stage, player: Tuple[Cell, Cell], mask: int):
+	block1, block2 = player
+	direction = get_direction(player)
+	pressed = [block1] if direction == Direction.standing or direction == Direction.none else [block1, block2]
+	for block in pressed:
+		for effect in stage.switches.get(block, ()):
+			if direction == Direction.standing:
+				if effect[0] == 't':
+					player = effect[1]
+				else:
+					mask = activate_bridge(mask, effect[1], effect[2])
+			elif effect[0] == 's':
+				mask = activate_bridge(mask, effect[1], effect[2])
+	return player, mask
+
+
+# Pure counterpart of State.move(commit=False): returns a new GameState or None, touches nothing
+def successor(stage: Stage, game_state: GameState, action: str) -> Optional[GameState]:
+	player = game_state.player
+	direction = get_direction(player)
+	if action == 'swap':
+		if direction != Direction.none or not is_valid(stage, player, game_state.mask):
+			return None
+		return GameState((player[1], player[0]), game_state.mask)
+
+	(dx1, dy1), (dx2, dy2) = moves[direction][action]
+	(x1, y1), (x2, y2) = player
+	player = ((x1 + dx1, y1 + dy1), (x2 + dx2, y2 + dy2))
+	if not is_valid(stage, player, game_state.mask):
+		return None
+
+	player, mask = check_switch(stage, player, game_state.mask)
+	if get_direction(player) != Direction.none and player[0] > player[1]:
+		# State.check_merge: the same block is always stored lower half first
+		player = (player[1], player[0])
+	return GameState(player, mask)
+
+
+def successors(stage: Stage, game_state: GameState) -> List[Tuple[str, GameState]]:
+	result = []
+	for action in actions:
+		next_state = successor(stage, game_state, action)
+		if next_state is not None:
+			result.append((action, next_state))
+	return result
@@ -0,0 +1,60 @@
+# coding=utf-8
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from distance import DistanceMap
+from state import State
+from transition import actions
+from utility import lazy_import
+
+draw = lazy_import('draw')
+
+# one distance map per stage answers every later hint on that stage
+distance_maps: Dict[int, DistanceMap] = {}
+
+
+class Hint:
+	def __init__(self, stage=1, start=True):
+		self.stage = stage
+		self.thread = None
+		if start:
+			self.start()
+
+	def start(self):
+		if self.stage not in distance_maps and self.thread is None:
+			# solve on a separate State so the one being played is never touched
+			self.thread = threading.Thread(target=self.solve, daemon=True)
+			self.thread.start()
+
+	def solve(self):
+		distance_maps[self.stage] = DistanceMap.from_state(State(stage=self.stage))
+
+	@property
+	def ready(self):
+		return self.stage in distance_maps
+
+	def next_move(self, state: State):
+		if not self.ready:
+			return None
+		distance_map = distance_maps[self.stage]
+		key = distance_map.table.pack(state.player, state.board)
+		action = distance_map.best_action(key)
+		if action is None:
+			return None
+		player, _ = distance_map.table.unpack(distance_map.table.successors[key, actions.index(action)])
+		return action, np.array(player)
+
+	def get_status(self, state: State) -> Optional[str]:
+		if not self.ready:
+			return 'solving...'
+		move = self.next_move(state)
+		return 'hint: {}'.format(move[0]) if move else None
+
+	def draw(self, state: State):
+		move = self.next_move(state)
+		if move is None:
+			return
+		for block in {tuple(block) for block in move[1].tolist()}:
+			draw.Draw.draw_cube(position=block, size=(1, 1, 0.05), face_color=draw.Draw.colors['yellow'])
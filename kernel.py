@@ -0,0 +1,226 @@
+# coding=utf-8
+from typing import List, Optional
+
+import numpy as np
+
+from game_state import Stage, pack
+from game_state import moves as game_moves
+from utility import actions as directions
+
+try:
+	from numba import njit
+
+	available = True
+except ImportError:
+	available = False
+
+
+	def njit(*args, **kwargs):
+		# without Numba the kernel is plain Python, correct but much slower than game_state
+		if args and callable(args[0]):
+			return args[0]
+		return lambda function: function
+
+# tile kinds of the integer board
+empty, floor, soft, goal, bridge = 0, 1, 2, 3, 4
+# switch kinds
+soft_switch, heavy_switch, teleport = 0, 1, 2
+
+# [direction, action] -> (dx1, dy1, dx2, dy2), game_state.moves as an array
+moves = np.array([[[offset for block in game_moves[direction][action] for offset in block]
+				   for action in directions[:4]] for direction in sorted(game_moves)], dtype=np.int64)
+
+
+class CompiledStage:
+	# A Stage flattened into integer arrays the kernel can read, cells indexed by y * width + x
+	def __init__(self, stage: Stage):
+		self.stage = stage
+		self.width, self.height, self.bits = stage.width, stage.height, stage.bridge_count
+		cells = self.width * self.height
+
+		self.kind = np.zeros(cells, dtype=np.int8)
+		self.bridge_bit = np.full(cells, -1, dtype=np.int8)
+		for (x, y) in stage.floor:
+			self.kind[y * self.width + x] = floor
+		for (x, y) in stage.soft:
+			self.kind[y * self.width + x] = soft
+		for (x, y) in stage.goal:
+			self.kind[y * self.width + x] = goal
+		for (x, y), bit in stage.bridge_bits.items():
+			self.kind[y * self.width + x] = bridge
+			self.bridge_bit[y * self.width + x] = bit
+
+		# effects of the switches on cell c are rows switch_offsets[c]:switch_offsets[c + 1]
+		effects = [[] for _ in range(cells)]
+		for (x, y), features in stage.switches.items():
+			for feature in features:
+				if feature[0] == 't':
+					(x1, y1), (x2, y2) = feature[1]
+					effects[y * self.width + x].append((teleport, 0, 0, x1, y1, x2, y2))
+				else:
+					kind = soft_switch if feature[0] == 's' else heavy_switch
+					effects[y * self.width + x].append((kind, feature[1], feature[2], 0, 0, 0, 0))
+		self.switch_offsets = np.zeros(cells + 1, dtype=np.int64)
+		np.cumsum([len(cell) for cell in effects], out=self.switch_offsets[1:])
+		self.switches = np.array([effect for cell in effects for effect in cell], dtype=np.int64).reshape(-1, 7)
+
+	@property
+	def arrays(self):
+		return self.kind, self.bridge_bit, self.switch_offsets, self.switches, moves, self.width, self.height, self.bits
+
+
+@njit(cache=True)
+def get_direction(x1, y1, x2, y2):
+	dx, dy = x2 - x1, y2 - y1
+	if dx == 0 and dy == 0:
+		return 0
+	elif (dx == 1 or dx == -1) and dy == 0:
+		return 1
+	elif (dy == 1 or dy == -1) and dx == 0:
+		return 2
+	return 3
+
+
+@njit(cache=True)
+def is_floor(kind, bridge_bit, width, height, x, y, mask):
+	if x < 0 or y < 0 or x >= width or y >= height:
+		return False
+	tile = kind[y * width + x]
+	if tile == bridge:
+		return (mask >> bridge_bit[y * width + x]) & 1 == 1
+	return tile != empty
+
+
+@njit(cache=True)
+def is_valid(kind, bridge_bit, width, height, x1, y1, x2, y2, mask):
+	if not is_floor(kind, bridge_bit, width, height, x1, y1, mask):
+		return False
+	if not is_floor(kind, bridge_bit, width, height, x2, y2, mask):
+		return False
+	return x1 != x2 or y1 != y2 or kind[y1 * width + x1] != soft
+
+
+@njit(cache=True)
+def activate_bridge(mask, mode, bit):
+	if mode == 0:
+		return mask | (1 << bit)
+	elif mode == 1:
+		return mask ^ (1 << bit)
+	return mask & ~(1 << bit)
+
+
+# Same rules as game_state.successor on a packed key, -1 when the move is not allowed
+@njit(cache=True)
+def successor(kind, bridge_bit, switch_offsets, switches, moves, width, height, bits, key, action):
+	cells = width * height
+	mask = key & ((1 << bits) - 1)
+	config = key >> bits
+	c1, c2 = config // cells, config % cells
+	x1, y1, x2, y2 = c1 % width, c1 // width, c2 % width, c2 // width
+	direction = get_direction(x1, y1, x2, y2)
+
+	if action == 4:
+		if direction != 3 or not is_valid(kind, bridge_bit, width, height, x1, y1, x2, y2, mask):
+			return -1
+		return ((c2 * cells + c1) << bits) | mask
+
+	x1 += moves[direction, action, 0]
+	y1 += moves[direction, action, 1]
+	x2 += moves[direction, action, 2]
+	y2 += moves[direction, action, 3]
+	if not is_valid(kind, bridge_bit, width, height, x1, y1, x2, y2, mask):
+		return -1
+
+	direction = get_direction(x1, y1, x2, y2)
+	pressed = 1 if direction == 0 or direction == 3 else 2
+	for block in range(pressed):
+		cell = y1 * width + x1 if block == 0 else y2 * width + x2
+		for row in range(switch_offsets[cell], switch_offsets[cell + 1]):
+			if direction == 0:
+				if switches[row, 0] == teleport:
+					x1, y1, x2, y2 = switches[row, 3], switches[row, 4], switches[row, 5], switches[row, 6]
+				else:
+					mask = activate_bridge(mask, switches[row, 1], switches[row, 2])
+			elif switches[row, 0] == soft_switch:
+				mask = activate_bridge(mask, switches[row, 1], switches[row, 2])
+
+	if get_direction(x1, y1, x2, y2) != 3 and (x1 > x2 or (x1 == x2 and y1 > y2)):
+		x1, y1, x2, y2 = x2, y2, x1, y1
+	return (((y1 * width + x1) * cells + y2 * width + x2) << bits) | mask
+
+
+@njit(cache=True)
+def is_goal(kind, bits, key):
+	# kind has one entry per cell
+	cells = kind.shape[0]
+	config = key >> bits
+	c1, c2 = config // cells, config % cells
+	return c1 == c2 and kind[c1] == goal
+
+
+@njit(cache=True)
+def get_slot(table, nodes, key):
+	# open addressing with linear probing; table holds node indices, -1 for free slots
+	size = table.shape[0]
+	slot = ((key ^ (key >> 17)) * 0x2545F491) & (size - 1)
+	while table[slot] >= 0 and nodes[table[slot]] != key:
+		slot = (slot + 1) & (size - 1)
+	return slot
+
+
+@njit(cache=True)
+def rehash(nodes, count, size):
+	table = np.full(size, -1, dtype=np.int64)
+	for index in range(count):
+		table[get_slot(table, nodes, nodes[index])] = index
+	return table
+
+
+# Breadth First Search in the order of Solver.node_bfs_path: every reached key is appended to
+# nodes with the index of its parent and the action taken, and the goal's index is returned
+@njit(cache=True)
+def search(kind, bridge_bit, switch_offsets, switches, moves, width, height, bits, start):
+	nodes = np.empty(1024, dtype=np.int64)
+	parents = np.empty(1024, dtype=np.int64)
+	actions = np.empty(1024, dtype=np.int8)
+	table = np.full(2048, -1, dtype=np.int64)
+	nodes[0], parents[0], actions[0] = start, -1, -1
+	table[get_slot(table, nodes, start)] = 0
+	count = 1
+
+	head = 0
+	while head < count:
+		key = nodes[head]
+		for action in range(5):
+			child = successor(kind, bridge_bit, switch_offsets, switches, moves, width, height, bits, key, action)
+			if child < 0:
+				continue
+			slot = get_slot(table, nodes, child)
+			if table[slot] >= 0:
+				continue
+
+			if count == nodes.shape[0]:
+				nodes = np.concatenate((nodes, np.empty(count, dtype=np.int64)))
+				parents = np.concatenate((parents, np.empty(count, dtype=np.int64)))
+				actions = np.concatenate((actions, np.empty(count, dtype=np.int8)))
+			nodes[count], parents[count], actions[count] = child, head, action
+			table[slot] = count
+			count += 1
+			if 2 * count > table.shape[0]:
+				table = rehash(nodes, count, 2 * table.shape[0])
+
+			if is_goal(kind, bits, child):
+				return nodes[:count], parents[:count], actions[:count], count - 1
+		head += 1
+	return nodes[:count], parents[:count], actions[:count], -1
+
+
+def bfs_path(compiled: CompiledStage) -> Optional[List[str]]:
+	nodes, parents, actions, found = search(*compiled.arrays, pack(compiled.stage, compiled.stage.start))
+	if found < 0:
+		return None
+	path = []
+	while parents[found] >= 0:
+		path.append(directions[actions[found]])
+		found = parents[found]
+	return path[::-1]
@@ -1,10 +1,14 @@
 # coding=utf-8
 import time
 
-import pygame
+started = time.perf_counter()
 
+import argparse
+from functools import partial
+
+from bloom import default_capacity, default_error_rate
 from state import State
-from utility import Method
+from utility import Method, PhaseTimer
 
 
 def time_function(func, stage, *args):
@@ -12,9 +16,9 @@ def time_function(func, stage, *args):
 	import psutil
 	process = psutil.Process(os.getpid())
 	before = process.memory_info().rss / 1024 / 1024
-	start = time.clock()
+	start = time.perf_counter()
 	func(*args)
-	end = time.clock()
+	end = time.perf_counter()
 	total = (end - start) * 1000
 	after = process.memory_info().rss / 1024 / 1024
 	print('Memory (Before): {0:.3f}MB'.format(before))
@@ -37,8 +41,19 @@ def time_function(func, stage, *args):
 		file.writelines(lines)
 
 
-def main(playable=True, visualize=True, method=Method.hill_climbing, stage=1):
-	state = State(stage=stage)
+def profile_function(func, stage, *args, output='profile.folded'):
+	import profiler
+	print('Profiling stage {}'.format(stage))
+	return profiler.profile_function(func, *args, output=output)
+
+
+def main(playable=True, visualize=True, method=Method.hill_climbing, stage=1, profile=None, startup=False,
+		 canonical=False, capacity=default_capacity, error_rate=default_error_rate):
+	timer = PhaseTimer(started, enabled=startup)
+	timer.mark('imports')
+	# canonical keys only suit the timing searches, the replayed paths need exact keys to stay shortest
+	state = State(stage=stage, canonical=canonical and not playable and not visualize)
+	timer.mark('level load')
 
 	if not playable:
 		from solver import Solver
@@ -50,31 +65,66 @@ def main(playable=True, visualize=True, method=Method.hill_climbing, stage=1):
 				path = Solver.bfs_path(state)
 			elif method is Method.depth_first_search:
 				path = Solver.dfs_path(state)
+			elif method is Method.distance_map:
+				path = Solver.distance_path(state)
+			elif method is Method.iterative_deepening:
+				path = Solver.iddfs_path(state)
+			elif method is Method.parallel_breadth_first_search:
+				path = Solver.parallel_bfs_path(state)
+			elif method is Method.compiled_breadth_first_search:
+				path = Solver.kernel_bfs_path(state)
 			else:
 				return
+			timer.mark('solve')
 			# reset position
 			state.restart()
 		else:
+			measure = partial(profile_function, output=profile) if profile else time_function
 			if method is Method.hill_climbing:
 				# Solver.hill_climbing(state)
 				return
 			elif method is Method.breadth_first_search:
-				time_function(Solver.bfs, stage, state)
+				measure(Solver.bfs, stage, state)
 			elif method is Method.depth_first_search:
-				time_function(Solver.dfs, stage, state)
+				measure(Solver.dfs, stage, state)
+			elif method is Method.distance_map:
+				measure(Solver.distance_path, stage, state)
+			elif method is Method.iterative_deepening:
+				measure(Solver.iddfs_path, stage, state)
+			elif method is Method.parallel_breadth_first_search:
+				measure(Solver.parallel_bfs_path, stage, state)
+			elif method is Method.compiled_breadth_first_search:
+				measure(Solver.kernel_bfs_path, stage, state)
+			elif method is Method.approximate_breadth_first_search:
+				measure(Solver.approximate_bfs, stage, state, capacity, error_rate)
+			timer.mark('solve')
+			timer.report()
+			if canonical:
+				Solver.canonical_report([stage])
 			return
 
+	import pygame
 	from display import Display
+	from hint import Hint
+	timer.mark('window imports')
 	pygame.init()
 	display = Display('Bloxorz', offset=(state.board.shape[1], state.board.shape[0]))
+	timer.mark('GL context')
 
+	# the hint solver starts only after the first frame so it does not slow it down
+	hint = Hint(stage, start=False) if playable else None
+	first_frame = True
 	steps = 0
 	next_action = ''
+	show_hint = False
 	while True:
 		if next_action != '' and state.degree == 90:
 			state.degree = 0
 			state.move(next_action)
 			next_action = ''
+			if show_hint:
+				show_hint = False
+				display.set_status()
 			if not playable:
 				steps += 1
 
@@ -95,6 +145,8 @@ def main(playable=True, visualize=True, method=Method.hill_climbing, stage=1):
 						next_action = 'right'
 					elif event.key == pygame.K_SPACE:
 						next_action = 'swap'
+					elif event.key == pygame.K_h:
+						show_hint = True
 					elif event.key == pygame.K_r and pygame.key.get_mods() and pygame.KMOD_CTRL:
 						state.restart()
 						next_action = ''
@@ -115,13 +167,47 @@ def main(playable=True, visualize=True, method=Method.hill_climbing, stage=1):
 						next_action = ''
 
 		state.draw_level()
+		if show_hint:
+			display.set_status(hint.get_status(state))
+			hint.draw(state)
 		state.draw_player()
 		display.update()
 
-
-main(
-		stage=4,
-		playable=True,
-		visualize=False,
-		method=Method.breadth_first_search
-)
+		if first_frame:
+			first_frame = False
+			timer.mark('first frame')
+			timer.report()
+			if hint is not None:
+				hint.start()
+
+
+if __name__ == '__main__':
+	methods = [name for name in vars(Method) if not name.startswith('_')]
+	parser = argparse.ArgumentParser(description='Bloxorz')
+	parser.add_argument('--stage', type=int, default=4)
+	parser.add_argument('--solve', action='store_true', help='let the solver play instead of the keyboard')
+	parser.add_argument('--visualize', action='store_true', help='replay the solution instead of timing the solver')
+	parser.add_argument('--method', choices=methods, default='breadth_first_search')
+	parser.add_argument('--profile', nargs='?', const='profile.folded', metavar='FILE',
+						help='profile the solver run and write collapsed stacks to FILE')
+	parser.add_argument('--canonical', action='store_true',
+						help='treat both orders of the halves as one state in the timing searches')
+	parser.add_argument('--capacity', type=int, default=default_capacity,
+						help='states the Bloom filter of approximate_breadth_first_search is sized for')
+	parser.add_argument('--error-rate', type=float, default=default_error_rate,
+						help='false positive rate of that filter at full capacity')
+	parser.add_argument('--startup', action='store_true', help='print how long each startup phase took')
+	arguments = parser.parse_args()
+
+	# the guard keeps worker processes of the parallel search from starting a game
+	main(
+			stage=arguments.stage,
+			playable=not arguments.solve,
+			visualize=arguments.visualize,
+			method=getattr(Method, arguments.method),
+			profile=arguments.profile,
+			startup=arguments.startup,
+			canonical=arguments.canonical,
+			capacity=arguments.capacity,
+			error_rate=arguments.error_rate
+	)
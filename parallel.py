@@ -0,0 +1,175 @@
+# coding=utf-8
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from game_state import Stage, is_goal, pack, successors, unpack
+from utility import actions
+
+minimum_rows = 1 << 12
+
+
+def get_owner(keys: np.ndarray, workers: int):
+	# Fibonacci hashing, so neighbouring packed states are spread over every shard
+	hashed = (keys.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(40)
+	return (hashed % np.uint64(workers)).astype(np.int64)
+
+
+class Mailbox:
+	# Shared memory segments of the other workers, re-attached only when one was reallocated
+	def __init__(self):
+		self.segments: Dict[int, shared_memory.SharedMemory] = {}
+
+	def get(self, index: int, name: str):
+		segment = self.segments.get(index)
+		if segment is None or segment.name != name:
+			if segment is not None:
+				segment.close()
+			segment = shared_memory.SharedMemory(name=name)
+			self.segments[index] = segment
+		return segment
+
+	def close(self):
+		for segment in self.segments.values():
+			segment.close()
+		self.segments = {}
+
+
+# Each worker owns the visited shard and frontier of the states hashed to it. Successors are
+# exchanged as (child, parent * 8 + action) int64 rows through the coordinator's shared memory.
+def work(index: int, workers: int, stage: Stage, connection):
+	visited = {}
+	frontier = []
+	mailbox = Mailbox()
+
+	while True:
+		command, *args = connection.recv()
+		if command == 'start':
+			visited = {args[0]: None}
+			frontier = [args[0]]
+		elif command == 'expand':
+			rows = []
+			for key in frontier:
+				for action, child in successors(stage, unpack(stage, key)):
+					rows.append((pack(stage, child), key * 8 + actions.index(action)))
+			data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+			owners = get_owner(data[:, 0], workers)
+			data = data[np.argsort(owners, kind='stable')]
+
+			connection.send(len(data))
+			segment = mailbox.get(index, connection.recv())
+			view = np.ndarray(data.shape, dtype=np.int64, buffer=segment.buf)
+			view[:] = data
+			del view
+			connection.send(np.bincount(owners, minlength=workers).tolist())
+		elif command == 'merge':
+			frontier = []
+			goal = -1
+			for source, (name, start, count) in enumerate(args[0]):
+				segment = mailbox.get(source, name)
+				view = np.ndarray((start + count, 2), dtype=np.int64, buffer=segment.buf)
+				rows = view[start:].tolist()
+				del view
+				for child, parent in rows:
+					if child not in visited:
+						visited[child] = parent
+						frontier.append(child)
+						if goal < 0 and is_goal(stage, unpack(stage, child)):
+							goal = child
+			connection.send((len(frontier), goal))
+		elif command == 'parent':
+			connection.send(visited[args[0]])
+		elif command == 'stop':
+			mailbox.close()
+			return
+
+
+class ParallelBfs:
+	# Layer-synchronous Breadth First Search over packed GameStates, hash-partitioned across processes
+	def __init__(self, stage: Stage, workers: Optional[int] = None):
+		self.stage = stage
+		self.workers = workers or multiprocessing.cpu_count()
+		self.segments: List[Optional[shared_memory.SharedMemory]] = [None] * self.workers
+		self.connections = []
+		self.processes = []
+		# workers must share this process's tracker, or theirs would unlink the segments on exit
+		resource_tracker.ensure_running()
+		for index in range(self.workers):
+			parent, child = multiprocessing.Pipe()
+			process = multiprocessing.Process(target=work, args=(index, self.workers, stage, child), daemon=True)
+			process.start()
+			self.connections.append(parent)
+			self.processes.append(process)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def get_owner(self, key: int):
+		return int(get_owner(np.array([key], dtype=np.int64), self.workers)[0])
+
+	def get_segment(self, index: int, rows: int):
+		segment = self.segments[index]
+		if segment is None or segment.size < rows * 16:
+			if segment is not None:
+				segment.close()
+				segment.unlink()
+			segment = shared_memory.SharedMemory(create=True, size=max(rows * 2, minimum_rows) * 16)
+			self.segments[index] = segment
+		return segment
+
+	def broadcast(self, message):
+		for connection in self.connections:
+			connection.send(message)
+		return [connection.recv() for connection in self.connections]
+
+	def solve(self) -> Optional[List[str]]:
+		start = pack(self.stage, self.stage.start)
+		self.connections[self.get_owner(start)].send(('start', start))
+
+		while True:
+			sizes = self.broadcast(('expand',))
+			names = []
+			for index, connection in enumerate(self.connections):
+				names.append(self.get_segment(index, sizes[index]).name)
+				connection.send(names[-1])
+			counts = [connection.recv() for connection in self.connections]
+
+			for target, connection in enumerate(self.connections):
+				sources = [(names[i], sum(counts[i][:target]), counts[i][target]) for i in range(self.workers)]
+				connection.send(('merge', sources))
+			results = [connection.recv() for connection in self.connections]
+
+			for _, goal in results:
+				if goal >= 0:
+					return self.get_path(goal)
+			if sum(count for count, _ in results) == 0:
+				return None
+
+	def get_path(self, key: int):
+		path = []
+		while True:
+			connection = self.connections[self.get_owner(key)]
+			connection.send(('parent', key))
+			parent = connection.recv()
+			if parent is None:
+				return path[::-1]
+			key, action = divmod(parent, 8)
+			path.append(actions[action])
+
+	def close(self):
+		for connection in self.connections:
+			connection.send(('stop',))
+		for process in self.processes:
+			process.join()
+		for segment in self.segments:
+			if segment is not None:
+				segment.close()
+				segment.unlink()
+		self.segments = [None] * self.workers
+		self.connections = []
+		self.processes = []
@@ -0,0 +1,190 @@
+# coding=utf-8
+import ast
+import copy
+import cProfile
+import inspect
+import os
+import tracemalloc
+from collections import defaultdict
+from functools import lru_cache
+
+from state import State
+
+hot_path = ['State.move', 'State.try_move', 'State.is_valid', 'State.check_switch', 'State.add_state',
+			'State.load_state']
+state_file = os.path.abspath(inspect.getsourcefile(State))
+# frames of the profiling harness itself, cut from the collapsed memory stacks
+harness = 'profiler.profile_function'
+wrapper = 'profiler.AllocationTracker.wrap.measure'
+
+
+@lru_cache(maxsize=None)
+def get_functions(filename: str):
+	# (first line, last line, qualified name) of every function defined in a file
+	try:
+		with open(filename) as file:
+			tree = ast.parse(file.read())
+	except (OSError, SyntaxError, ValueError):
+		return []
+
+	functions = []
+
+	def visit(node, prefix):
+		for child in ast.iter_child_nodes(node):
+			if isinstance(child, ast.ClassDef):
+				visit(child, prefix + child.name + '.')
+			elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+				# cProfile reports a decorated function at its first decorator
+				first = min([child.lineno] + [decorator.lineno for decorator in child.decorator_list])
+				functions.append((first, child.end_lineno, prefix + child.name))
+				visit(child, prefix + child.name + '.')
+
+	visit(tree, '')
+	# innermost first, so nested functions win over the ones around them
+	return sorted(functions, key=lambda function: function[1] - function[0])
+
+
+def get_function(filename: str, line: int):
+	for first, last, name in get_functions(filename):
+		if first <= line <= last:
+			return name
+	return None
+
+
+def get_label(filename: str, line: int, name: str = None):
+	if filename == '~':
+		return name
+	module = os.path.splitext(os.path.basename(filename))[0]
+	return '{}.{}'.format(module, get_function(filename, line) or name or line)
+
+
+# Caller/callee times of cProfile unfolded into flame graph stacks. cProfile only keeps one level of
+# callers, so a function's time under a given stack is its total scaled by that stack's share
+def collapse_time(stats: dict):
+	children = defaultdict(list)
+	for callee, (_, _, _, _, callers) in stats.items():
+		for caller, edge in callers.items():
+			children[caller].append((callee, edge[3]))
+
+	stacks = defaultdict(float)
+
+	def walk(key, stack, labels, scale):
+		labels = labels + [get_label(*key)]
+		stacks[';'.join(labels)] += stats[key][2] * scale
+		for callee, edge in children[key]:
+			share = scale * edge / stats[callee][3] if stats[callee][3] else 0
+			if callee not in stack and share * stats[callee][3] > 1e-6:
+				walk(callee, stack | {callee}, labels, share)
+
+	for key, value in stats.items():
+		# the only caller-less entries are the profiled function and Profile.disable itself
+		if not value[4] and 'disable' not in key[2]:
+			walk(key, {key}, [], 1.0)
+	return stacks
+
+
+def collapse_memory(snapshot: tracemalloc.Snapshot):
+	stacks = defaultdict(int)
+	for trace in snapshot.traces:
+		labels = [get_label(frame.filename, frame.lineno) for frame in trace.traceback]
+		if harness in labels:
+			# rooted at the profiled function like the time stacks
+			labels = labels[len(labels) - labels[::-1].index(harness):]
+		labels = [label for label in labels if label != wrapper]
+		stacks[';'.join(labels)] += trace.size
+	return stacks
+
+
+def write_stacks(path: str, stacks: dict, unit: float):
+	with open(path, 'w') as file:
+		for stack, value in sorted(stacks.items()):
+			if round(value * unit) > 0:
+				file.write('{} {}\n'.format(stack, round(value * unit)))
+
+
+class AllocationTracker:
+	# Wraps the hot path methods of State and adds up, for every call, the highest traced memory above
+	# the level at its entry. tracemalloc has a single peak counter, so before a nested call resets it
+	# the peak reached so far is folded into the frame of the caller.
+	def __init__(self, names):
+		self.names = names
+		self.allocated = defaultdict(int)
+		self.originals = {}
+		# [traced memory at entry, highest peak folded in] of every call in progress
+		self.stack = []
+		self.peak = 0
+
+	def fold(self, peak: int):
+		self.peak = max(self.peak, peak)
+		if self.stack:
+			self.stack[-1][1] = max(self.stack[-1][1], peak)
+
+	def wrap(self, name: str, function):
+		def measure(*args, **kwargs):
+			current, peak = tracemalloc.get_traced_memory()
+			self.fold(peak)
+			self.stack.append([current, 0])
+			tracemalloc.reset_peak()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				start, folded = self.stack.pop()
+				peak = max(tracemalloc.get_traced_memory()[1], folded)
+				self.allocated[name] += peak - start
+				self.fold(peak)
+
+		return measure
+
+	def __enter__(self):
+		for name in self.names:
+			method = name.split('.')[1]
+			self.originals[method] = getattr(State, method)
+			setattr(State, method, self.wrap(name, self.originals[method]))
+		return self
+
+	def __exit__(self, *args):
+		for method, function in self.originals.items():
+			setattr(State, method, function)
+		self.fold(tracemalloc.get_traced_memory()[1])
+
+
+# Runs func under cProfile, prints time and allocations of the hot path functions and writes collapsed
+# stacks of time (microseconds) to output and of memory still held at the end (bytes) next to it.
+# Allocations are measured in a second run on a copy of the arguments, so tracemalloc and the
+# wrappers do not slow down the timed one.
+def profile_function(func, *args, output='profile.folded'):
+	copies = copy.deepcopy(args)
+	profiler = cProfile.Profile()
+	profiler.enable()
+	result = func(*args)
+	profiler.disable()
+	profiler.create_stats()
+	stats = profiler.stats
+
+	tracemalloc.start(64)
+	with AllocationTracker(hot_path) as tracker:
+		func(*copies)
+	# the tracker's own bookkeeping is allocated in this file
+	snapshot = tracemalloc.take_snapshot().filter_traces([
+		tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+	tracemalloc.stop()
+
+	timing = {}
+	for (filename, line, name), (_, calls, total, cumulative, _) in stats.items():
+		label = get_label(filename, line, name)
+		if os.path.abspath(filename) == state_file and label[len('state.'):] in hot_path:
+			timing[label[len('state.'):]] = (calls, total, cumulative)
+
+	print('{0:<20}{1:>10}{2:>14}{3:>18}{4:>16}'.format('Function', 'Calls', 'Time (ms)', 'Cumulative (ms)', 'Allocated (KB)'))
+	for name in hot_path:
+		calls, total, cumulative = timing.get(name, (0, 0, 0))
+		print('{0:<20}{1:>10}{2:>14.3f}{3:>18.3f}{4:>16.3f}'.format(
+				name, calls, total * 1000, cumulative * 1000, tracker.allocated[name] / 1024))
+	print('Allocated: highest memory above the level at entry of each call, summed over the calls')
+	print('Peak traced memory: {0:.3f}MB'.format(tracker.peak / 1024 / 1024))
+
+	write_stacks(output, collapse_time(stats), 1e6)
+	memory_output = os.path.splitext(output)[0] + '.memory' + (os.path.splitext(output)[1] or '.folded')
+	write_stacks(memory_output, collapse_memory(snapshot), 1)
+	print('Collapsed stacks: {} (time), {} (memory held at the end)'.format(output, memory_output))
+	return result
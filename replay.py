@@ -0,0 +1,171 @@
+# coding=utf-8
+import argparse
+import glob
+import hashlib
+import os
+import re
+import struct
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from game_state import Stage, is_goal, successor
+from state import State
+from utility import actions
+
+# file: magic, then records of (8 byte stage hash, uint32 move count, moves packed 3 bits each)
+magic = b'BLXR\x01'
+header = struct.Struct('<8sI')
+
+
+class Replay:
+	__slots__ = ('stage_hash', 'actions')
+
+	def __init__(self, stage_hash: bytes, actions: List[int]):
+		self.stage_hash = stage_hash
+		self.actions = actions
+
+	@classmethod
+	def from_moves(cls, stage_hash: bytes, moves: List[str]):
+		return cls(stage_hash, [actions.index(move) for move in moves])
+
+	def encode(self):
+		value = 0
+		for index, action in enumerate(self.actions):
+			value |= action << (3 * index)
+		return header.pack(self.stage_hash, len(self.actions)) + value.to_bytes((3 * len(self.actions) + 7) // 8, 'little')
+
+	@classmethod
+	def decode(cls, data: bytes, offset=0):
+		if offset + header.size > len(data):
+			raise ValueError('truncated header')
+		stage_hash, count = header.unpack_from(data, offset)
+		offset += header.size
+		size = (3 * count + 7) // 8
+		if offset + size > len(data):
+			raise ValueError('truncated moves ({} of {} bytes)'.format(len(data) - offset, size))
+		value = int.from_bytes(data[offset:offset + size], 'little')
+		return cls(stage_hash, [(value >> (3 * index)) & 7 for index in range(count)]), offset + size
+
+
+def get_stage_hash(state: State):
+	# hash of the tiles as loaded, so spacing in the stage file does not matter
+	text = '\n'.join(' '.join(str(tile) for tile in row) for row in state.board.tolist())
+	return hashlib.sha256(text.encode()).digest()[:8]
+
+
+def save(path: str, replays: List[Replay]):
+	with open(path, 'wb') as file:
+		file.write(magic)
+		for replay in replays:
+			file.write(replay.encode())
+
+
+def load(path: str) -> Iterator[Replay]:
+	with open(path, 'rb') as file:
+		data = file.read()
+	if not data.startswith(magic):
+		raise ValueError('{} is not a replay file'.format(path))
+	offset = len(magic)
+	index = 0
+	while offset < len(data):
+		try:
+			replay, offset = Replay.decode(data, offset)
+		except ValueError as error:
+			raise ValueError('{0}#{1}: {2}'.format(path, index, error))
+		yield replay
+		index += 1
+
+
+def load_stages(folder='Stages') -> Dict[bytes, Stage]:
+	stages = {}
+	for path in glob.glob(os.path.join(folder, 'stage_*.txt')):
+		state = State(stage=int(re.search(r'stage_(\d+)', path).group(1)))
+		stages[get_stage_hash(state)] = Stage.from_state(state)
+	return stages
+
+
+class Verifier:
+	# Replays through game_state.successor; transitions are memoized per stage because
+	# recorded solutions of the same stage mostly walk the same states
+	def __init__(self, stages: Dict[bytes, Stage]):
+		self.stages = stages
+		self.transitions: Dict[bytes, dict] = {stage_hash: {} for stage_hash in stages}
+
+	# None when the replay solves its stage, otherwise (index of the first bad move, reason)
+	def verify(self, replay: Replay) -> Optional[Tuple[int, str]]:
+		stage = self.stages.get(replay.stage_hash)
+		if stage is None:
+			return 0, 'unknown stage'
+		transitions = self.transitions[replay.stage_hash]
+
+		node = stage.start
+		for index, action in enumerate(replay.actions):
+			if action >= len(actions):
+				return index, 'unknown action'
+			if is_goal(stage, node):
+				return index, 'move after the goal'
+			key = (node, action)
+			if key not in transitions:
+				transitions[key] = successor(stage, node, actions[action])
+			node = transitions[key]
+			if node is None:
+				return index, 'invalid move'
+		if not is_goal(stage, node):
+			return len(replay.actions), 'goal not reached'
+		return None
+
+	def verify_all(self, replays) -> List[Tuple[int, Tuple[int, str]]]:
+		failures = []
+		for index, replay in enumerate(replays):
+			result = self.verify(replay)
+			if result is not None:
+				failures.append((index, result))
+		return failures
+
+
+def record(path: str, stages: List[int]):
+	from solver import Solver
+	replays = []
+	for number in stages:
+		state = State(stage=number)
+		replays.append(Replay.from_moves(get_stage_hash(state), Solver.node_bfs_path(state)))
+	save(path, replays)
+	print('Recorded {} solutions to {}'.format(len(replays), path))
+
+
+def verify(paths: List[str]):
+	verifier = Verifier(load_stages())
+	total, failed = 0, 0
+	for path in paths:
+		replays = []
+		try:
+			for replay in load(path):
+				replays.append(replay)
+		except ValueError as error:
+			# the records before the broken one are still checked
+			print(error)
+			total += 1
+			failed += 1
+		failures = verifier.verify_all(replays)
+		total += len(replays)
+		failed += len(failures)
+		for index, (step, reason) in failures:
+			print('{0}#{1}: {2} at move {3}'.format(path, index, reason, step))
+	print('{} replays, {} invalid'.format(total, failed))
+	return failed == 0
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Bloxorz replay files')
+	commands = parser.add_subparsers(dest='command', required=True)
+	record_parser = commands.add_parser('record', help='write the optimal solution of stages to a replay file')
+	record_parser.add_argument('file')
+	record_parser.add_argument('stages', type=int, nargs='+')
+	verify_parser = commands.add_parser('verify', help='check every replay in the files')
+	verify_parser.add_argument('files', nargs='+')
+	arguments = parser.parse_args()
+
+	if arguments.command == 'record':
+		record(arguments.file, arguments.stages)
+	else:
+		sys.exit(0 if verify(arguments.files) else 1)
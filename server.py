@@ -0,0 +1,121 @@
+# coding=utf-8
+import argparse
+import asyncio
+import json
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from distance import DistanceMap, unreachable
+from state import State
+
+default_port = 8765
+
+
+def build(stage: int):
+	return DistanceMap.from_state(State(stage=stage))
+
+
+class SolverServer:
+	# Keeps one distance map per stage in memory; requests for a stage that is still being solved
+	# all wait on the same job in the process pool instead of starting their own
+	def __init__(self, workers: Optional[int] = None):
+		self.executor = ProcessPoolExecutor(max_workers=workers)
+		self.distance_maps: Dict[int, DistanceMap] = {}
+		self.paths: Dict[int, List[str]] = {}
+		self.pending: Dict[int, asyncio.Future] = {}
+
+	def finish(self, stage: int, future: asyncio.Future):
+		del self.pending[stage]
+		if not future.cancelled() and future.exception() is None:
+			self.distance_maps[stage] = future.result()
+
+	async def get_distance_map(self, stage: int):
+		if stage in self.distance_maps:
+			return self.distance_maps[stage]
+
+		future = self.pending.get(stage)
+		if future is None:
+			future = asyncio.get_running_loop().run_in_executor(self.executor, build, stage)
+			future.add_done_callback(lambda done: self.finish(stage, done))
+			self.pending[stage] = future
+		# a client hanging up must not cancel the job the others are waiting on
+		return await asyncio.shield(future)
+
+	async def respond(self, request: dict):
+		stage = int(request['stage'])
+		distance_map = await self.get_distance_map(stage)
+
+		if request.get('type', 'solve') == 'solve':
+			if stage not in self.paths:
+				self.paths[stage] = distance_map.path()
+			return {'stage': stage, 'path': self.paths[stage]}
+		elif request['type'] == 'hint':
+			table = distance_map.table
+			mask = int(request.get('mask', table.start % table.mask_count))
+			if mask < 0 or mask >= table.mask_count:
+				raise ValueError('mask {} out of range for {} bridges'.format(mask, len(table.bridges)))
+			key = table.get_key(request['player'], mask)
+			distance = int(distance_map.distances[key])
+			return {'stage': stage, 'action': distance_map.best_action(key),
+					'distance': None if distance == unreachable else distance}
+		raise ValueError('Unknown request type: {}'.format(request['type']))
+
+	# One JSON request per line, answered in order with one JSON line each
+	async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		while True:
+			line = await reader.readline()
+			if not line:
+				break
+			try:
+				response = await self.respond(json.loads(line))
+			except Exception as error:
+				response = {'error': '{}: {}'.format(type(error).__name__, error)}
+			writer.write((json.dumps(response) + '\n').encode())
+			await writer.drain()
+		writer.close()
+
+	async def serve(self, path: Optional[str] = None, host='127.0.0.1', port=default_port, preload=()):
+		for stage in preload:
+			await self.get_distance_map(stage)
+
+		if path:
+			server = await asyncio.start_unix_server(self.handle, path=path)
+		else:
+			server = await asyncio.start_server(self.handle, host=host, port=port)
+		async with server:
+			await server.serve_forever()
+
+	def close(self):
+		self.executor.shutdown()
+
+
+# Blocking client for a single request
+def request(message: dict, path: Optional[str] = None, host='127.0.0.1', port=default_port):
+	if path:
+		connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		connection.connect(path)
+	else:
+		connection = socket.create_connection((host, port))
+	with connection, connection.makefile('rwb') as stream:
+		stream.write((json.dumps(message) + '\n').encode())
+		stream.flush()
+		return json.loads(stream.readline())
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Bloxorz solver daemon')
+	parser.add_argument('--socket', help='listen on this Unix socket instead of TCP')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=default_port)
+	parser.add_argument('--workers', type=int, help='solver processes (default: one per core)')
+	parser.add_argument('--preload', type=int, nargs='*', default=[], help='stages to solve before listening')
+	arguments = parser.parse_args()
+
+	solver_server = SolverServer(arguments.workers)
+	try:
+		asyncio.run(solver_server.serve(arguments.socket, arguments.host, arguments.port, arguments.preload))
+	except KeyboardInterrupt:
+		pass
+	finally:
+		solver_server.close()
@@ -1,23 +1,48 @@
 # coding=utf-8
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from bloom import ApproximateVisited, default_capacity, default_error_rate, default_recent
+from distance import DistanceMap
+from game_state import Stage, is_goal, successors
 from state import State
-from utility import Direction
+from utility import Direction, actions
+
+# entries of the transposition table of iddfs_path
+default_table_size = 100000
 
 
 class Solver:
+	# Tries every move of the loaded state, returns True once the goal is found
+	@staticmethod
+	def expand(state: State):
+		for direction in ['up', 'down', 'left', 'right']:
+			if state.move(direction, False):
+				if state.found:
+					return True
+
+		if state.get_direction(state.player) == Direction.none:
+			if state.canonical:
+				# the swapped block has the same canonical key and is never queued,
+				# so the other half is moved from here instead
+				state.player = state.player[[1, 0], :]
+				for direction in ['up', 'down', 'left', 'right']:
+					if state.move(direction, False):
+						if state.found:
+							return True
+			else:
+				state.move('swap', False)
+		return False
+
 	# Simple Depth First Search to calculate time
 	@staticmethod
 	def dfs(state: State):
 		while state.states:
 			player, bridge = state.states.pop()
 			state.load_state(player, bridge)
-
-			for direction in ['up', 'down', 'left', 'right']:
-				if state.move(direction, False):
-					if state.found:
-						return
-
-			if state.get_direction(state.player) == Direction.none:
-				state.move('swap', False)
+			if Solver.expand(state):
+				return
 
 	# Simple Breadth First Search to calculate time
 	@staticmethod
@@ -25,14 +50,35 @@ class Solver:
 		while state.states:
 			player, bridge = state.states.pop(0)
 			state.load_state(player, bridge)
+			if Solver.expand(state):
+				return
 
-			for direction in ['up', 'down', 'left', 'right']:
-				if state.move(direction, False):
-					if state.found:
-						return
+	# Breadth First Search with a Bloom filter behind a small exact set as visited states,
+	# for state spaces that do not fit in memory; the found flag may then be a false negative
+	@staticmethod
+	def approximate_bfs(state: State, capacity=default_capacity, error_rate=default_error_rate, recent=default_recent):
+		visited = ApproximateVisited(capacity, error_rate, recent)
+		for key in state.visited:
+			visited.append(key)
+		state.visited = visited
+		Solver.bfs(state)
 
-			if state.get_direction(state.player) == Direction.none:
-				state.move('swap', False)
+		print('States: {0} ({1:.3f}KB visited set)'.format(len(visited), visited.memory / 1024))
+		print('False positive rate: {0:.6f}'.format(visited.filter.error_rate))
+		print('Expected new states pruned (at most): {0:.6f}'.format(visited.expected_pruned))
+		print('Solution missed (union bound): {0:.6f}'.format(0 if state.found else visited.miss_probability))
+		return visited
+
+	# Visited states of the Breadth First Search with and without canonical keys
+	@staticmethod
+	def canonical_report(stages):
+		for stage in stages:
+			counts = []
+			for canonical in [False, True]:
+				state = State(stage=stage, canonical=canonical)
+				Solver.bfs(state)
+				counts.append(len(state.visited))
+			print('Stage {0}: {1} -> {2} states ({3} saved)'.format(stage, counts[0], counts[1], counts[0] - counts[1]))
 
 	# Depth First Search with path to visualize
 	@staticmethod
@@ -69,3 +115,104 @@ class Solver:
 			if state.get_direction(state.player) == Direction.none:
 				if state.move('swap', False):
 					move_queue.append(move + ['swap'])
+
+	# Optimal path read off the distance map of the whole stage
+	@staticmethod
+	def distance_path(state: State):
+		return DistanceMap.from_state(state).path()
+
+	# Iterative Deepening Depth First Search, optimal like bfs_path while only keeping the current
+	# path and a bounded transposition table (least recently used entries are dropped first).
+	# Every node goes through State's numpy move rules, so it is far slower than node_bfs_path
+	# (stage 10: about a minute against 30 ms); it is meant for stages too big to keep every state.
+	@staticmethod
+	def iddfs_path(state: State, table_size=default_table_size):
+		player, board, degree = state.player, state.board, state.degree
+		limit = 0
+		while True:
+			path, cutoff = Solver.depth_limited(state, player, board, limit, OrderedDict(), table_size)
+			if path is not None or not cutoff:
+				state.player, state.board, state.degree = player, board, degree
+				return path
+			limit += 1
+
+	# One depth-limited iteration without recursion: a (player, board, moves left) frame for every
+	# expanded node of the path, which is one list the moves are pushed to and popped from
+	@staticmethod
+	def depth_limited(state: State, player: np.ndarray, board: np.ndarray, limit: int, table: OrderedDict,
+					  table_size: int):
+		path, stack, cutoff = [], [], False
+		while True:
+			depth = len(path)
+			if state.check_goal(player, board):
+				return path, False
+			if depth == limit:
+				cutoff = True
+			else:
+				# shallowest depth this state was reached at in the current iteration
+				key = (tuple(player.flatten().tolist()), tuple(state.get_bridges_status(board)))
+				if table.get(key, limit) > depth:
+					table[key] = depth
+					table.move_to_end(key)
+					if len(table) > table_size:
+						table.popitem(last=False)
+					stack.append((player, board, iter(actions)))
+
+			# next move of the deepest frame that has one left, backtracking past the others
+			while stack:
+				if len(stack) == len(path):
+					# the node the last move reached was not expanded
+					path.pop()
+				player, board, moves = stack[-1]
+				result = None
+				for direction in moves:
+					if direction == 'swap' and state.get_direction(player) != Direction.none:
+						continue
+					state.player, state.board = player, board
+					result = state.next_state(direction)
+					if result is not None:
+						break
+				if result is not None:
+					player, board = result
+					if state.check_merge(player):
+						player = player[[1, 0], :]
+					path.append(direction)
+					break
+				stack.pop()
+			else:
+				return None, cutoff
+
+	# Breadth First Search over immutable GameState nodes with a hashed visited set
+	@staticmethod
+	def node_bfs_path(state: State):
+		stage = Stage.from_state(state)
+		parents = {stage.start: None}
+		queue = deque([stage.start])
+		while queue:
+			node = queue.popleft()
+			for direction, child in successors(stage, node):
+				if child in parents:
+					continue
+				parents[child] = (node, direction)
+				if is_goal(stage, child):
+					path = []
+					while parents[child] is not None:
+						child, direction = parents[child]
+						path.append(direction)
+					return path[::-1]
+				queue.append(child)
+
+	# node_bfs_path compiled with Numba when it is installed, the same search in plain Python otherwise
+	@staticmethod
+	def kernel_bfs_path(state: State):
+		import kernel
+		if not kernel.available:
+			return Solver.node_bfs_path(state)
+		return kernel.bfs_path(kernel.CompiledStage(Stage.from_state(state)))
+
+	# Breadth First Search spread over worker processes, one visited shard each
+	@staticmethod
+	def parallel_bfs_path(state: State, workers=None):
+		from parallel import ParallelBfs
+		with ParallelBfs(Stage.from_state(state), workers) as search:
+			return search.solve()
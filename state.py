@@ -3,10 +3,12 @@ import sys
 from typing import List, Tuple
 
 import numpy as np
-from OpenGL.GL import glLineWidth, glPopMatrix, glPushMatrix, glRotate, glTranslate
 
-from draw import Draw
-from utility import Direction, Tile
+from utility import Direction, Tile, lazy_import
+
+# only loaded once something is drawn, solver runs never import OpenGL
+gl = lazy_import('OpenGL.GL')
+draw = lazy_import('draw')
 
 # Nothing:			---
 # Heavy/Soft Floor:	ooo|iii
@@ -21,7 +23,8 @@ rotating_speed = 15
 
 class State:
 
-	def __init__(self, stage=1):
+	def __init__(self, stage=1, canonical=False):
+		self.canonical = canonical
 		self.steps = 0
 		self.degree = 0
 		self.found = False
@@ -37,7 +40,7 @@ class State:
 			sys.exit()
 
 		self.states = [(self.player.tolist(), self.get_bridges_status(self.board))]
-		self.visited = [(self.player.tolist(), self.get_bridges_status(self.board))]
+		self.visited = [self.get_key(self.states[0])]
 		self.move_direction = 'none'
 
 	# self.eval_map = None
@@ -172,15 +175,22 @@ class State:
 
 		return player
 
-	def move(self, action: str, commit=True):
-		self.previous = np.copy(self.player)
+	def next_state(self, action: str):
 		player = self.try_move(action)
 
 		if self.is_valid(player):
 			if action != 'swap':
-				player, board = self.check_switch(player)
-			else:
-				board = self.board
+				return self.check_switch(player)
+			return player, self.board
+
+		return None
+
+	def move(self, action: str, commit=True):
+		self.previous = np.copy(self.player)
+		result = self.next_state(action)
+
+		if result is not None:
+			player, board = result
 
 			if commit:
 				self.board = board
@@ -205,10 +215,17 @@ class State:
 			result.append((key, board[y, x][0]))
 		return result
 
+	def get_key(self, data):
+		# with canonical keys both halves of a block are unordered, so a split block
+		# is the same state whichever half is active and a lying block in either order
+		player, bridges = data
+		return (sorted(player), bridges) if self.canonical else data
+
 	def add_state(self, player: np.ndarray, board: np.ndarray):
 		data = (player.tolist(), self.get_bridges_status(board))
-		if data not in self.visited:
-			self.visited.append(data)
+		key = self.get_key(data)
+		if key not in self.visited:
+			self.visited.append(key)
 			self.states.append(data)
 			return True
 		return False
@@ -281,25 +298,25 @@ class State:
 			return
 		first_char = feature[0]
 		if feature == 'ooo' or feature == 'PPP':
-			Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=Draw.colors['white'])
+			draw.Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=draw.Draw.colors['white'])
 		elif feature == 'iii':
-			Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=Draw.colors['orange'])
+			draw.Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=draw.Draw.colors['orange'])
 		elif first_char == 's':
-			Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=Draw.colors['white'])
-			Draw.draw_round_switch(position=(x, y), color=Draw.colors['steel'])
+			draw.Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=draw.Draw.colors['white'])
+			draw.Draw.draw_round_switch(position=(x, y), color=draw.Draw.colors['steel'])
 		elif first_char == 'S':
-			Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=Draw.colors['white'])
-			Draw.draw_x_switch(position=(x, y), color=Draw.colors['steel'])
+			draw.Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=draw.Draw.colors['white'])
+			draw.Draw.draw_x_switch(position=(x, y), color=draw.Draw.colors['steel'])
 		elif first_char == 'B':
-			Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=Draw.colors['light_pink'])
+			draw.Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=draw.Draw.colors['light_pink'])
 		elif first_char == 'b':
-			Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=Draw.colors['gray'])
+			draw.Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=draw.Draw.colors['gray'])
 		elif first_char == 't':
 			if feature[2] == 't':
-				Draw.draw_teleport_switch(position=(x, y), color=Draw.colors['steel'])
-				Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=Draw.colors['white'])
+				draw.Draw.draw_teleport_switch(position=(x, y), color=draw.Draw.colors['steel'])
+				draw.Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=draw.Draw.colors['white'])
 			else:
-				Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=Draw.colors['white'])
+				draw.Draw.draw_cube(position=(x, y), size=(1, 1, -0.2), face_color=draw.Draw.colors['white'])
 
 	def draw_level(self):
 		height, width = self.board.shape
@@ -319,18 +336,18 @@ class State:
 	@staticmethod
 	def draw_main_cube(block: Tuple[int, int], direction: int):
 		if direction == Direction.standing:
-			Draw.draw_cube(position=block, size=(1, 1, 2))
+			draw.Draw.draw_cube(position=block, size=(1, 1, 2))
 		elif direction == Direction.laying_x:
-			Draw.draw_cube(position=block, size=(2, 1, 1))
+			draw.Draw.draw_cube(position=block, size=(2, 1, 1))
 		elif direction == Direction.laying_y:
-			Draw.draw_cube(position=block, size=(1, 2, 1))
+			draw.Draw.draw_cube(position=block, size=(1, 2, 1))
 		else:
-			Draw.draw_cube(position=block, size=(1, 1, 1))
+			draw.Draw.draw_cube(position=block, size=(1, 1, 1))
 
 	@staticmethod
 	def draw_secondary_cube(block: Tuple[int, int], direction: int):
 		if direction == Direction.none:
-			Draw.draw_cube(position=block, size=(1, 1, 1), face_color=Draw.colors['light_gray'])
+			draw.Draw.draw_cube(position=block, size=(1, 1, 1), face_color=draw.Draw.colors['light_gray'])
 
 	def rotate_player(self):
 		current = self.player
@@ -344,9 +361,9 @@ class State:
 		else:
 			self.degree += rotating_speed
 		if (current - self.previous).tolist() != [[0, 0], [0, 0]]:
-			glTranslate(x_center, -y_center, 0)
-			glRotate(self.degree, y_diff, x_diff, 0)
-			glTranslate(-x_center, y_center, 0)
+			gl.glTranslate(x_center, -y_center, 0)
+			gl.glRotate(self.degree, y_diff, x_diff, 0)
+			gl.glTranslate(-x_center, y_center, 0)
 
 		if self.degree == 90:
 			return True
@@ -366,9 +383,9 @@ class State:
 			x_center += 2
 			x_diff = 2
 		if self.steps == 1:
-			glTranslate(x_center, -y_center, 0)
-			glRotate(90, y_diff, x_diff, 0)
-			glTranslate(-x_center, y_center, 0)
+			gl.glTranslate(x_center, -y_center, 0)
+			gl.glRotate(90, y_diff, x_diff, 0)
+			gl.glTranslate(-x_center, y_center, 0)
 			return False
 
 		if self.degree + rotating_speed >= 90:
@@ -376,9 +393,9 @@ class State:
 		else:
 			self.degree += rotating_speed
 
-		glTranslate(x_center, -y_center, 0)
-		glRotate(self.degree, y_diff, x_diff, 0)
-		glTranslate(-x_center, y_center, 0)
+		gl.glTranslate(x_center, -y_center, 0)
+		gl.glRotate(self.degree, y_diff, x_diff, 0)
+		gl.glTranslate(-x_center, y_center, 0)
 
 		if self.degree == 90:
 			return True
@@ -387,7 +404,7 @@ class State:
 	def teleport_player(self, add_height, speed):
 		if self.steps == 1:
 			height = add_height * self.degree / 90
-			glTranslate(0, 0, height)
+			gl.glTranslate(0, 0, height)
 			if self.degree + speed >= 90:
 				self.degree = 90
 				self.steps = 0
@@ -397,8 +414,8 @@ class State:
 		return False
 
 	def draw_player(self):
-		glLineWidth(2)
-		glPushMatrix()
+		gl.glLineWidth(2)
+		gl.glPushMatrix()
 
 		if self.degree == 90:
 			if not self.check_goal(self.player, self.board):
@@ -423,6 +440,6 @@ class State:
 			else:
 				self.rotate_player()
 			self.draw_main_cube(self.previous[0], direction)
-		glPopMatrix()
-		glLineWidth(1)
+		gl.glPopMatrix()
+		gl.glLineWidth(1)
 	# endregion
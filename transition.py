@@ -0,0 +1,192 @@
+# coding=utf-8
+from typing import List, Tuple
+
+import numpy as np
+
+from state import State
+from utility import Direction, actions
+
+
+class TransitionTable:
+	# Every (configuration, bridge mask) pair of a stage packed into one integer:
+	# key = configuration index * mask_count + mask, where bit i of the mask is set
+	# when the i-th bridge of State.bridges is on ('B').
+	def __init__(self, state: State, build=True):
+		self.bridges = state.bridges
+		self.teleporter = state.teleporter
+		self.board = np.copy(state.board)
+		self.mask_count = 1 << len(self.bridges)
+		self.configs = []
+		self.config_index = {}
+		self.successors = np.array([], dtype=np.int32)
+		self.goal = np.array([], dtype=bool)
+		if build:
+			self.build(state)
+		else:
+			# only the configurations, enough to know the size of the table
+			self.load_configs(state)
+		self.start = self.pack(state.player, state.board)
+
+	@property
+	def size(self):
+		return len(self.configs) * self.mask_count
+
+	# region Packing
+	def get_mask(self, board: np.ndarray):
+		mask = 0
+		for bit, positions in enumerate(self.bridges.values()):
+			x, y = positions[0]
+			if str(board[y, x])[0] == 'B':
+				mask |= 1 << bit
+		return mask
+
+	def get_bridges(self, mask: int):
+		return [(key, 'B' if mask >> bit & 1 else 'b') for bit, key in enumerate(self.bridges)]
+
+	def get_key(self, player, mask: int):
+		player = np.array(player)
+		if State.get_direction(player) != Direction.none and (player[0] > player[1]).any():
+			# same block, stored with the lower half first like State.check_merge does
+			player = player[::-1]
+		config = tuple(map(tuple, player.tolist()))
+		return self.config_index[config] * self.mask_count + mask
+
+	def pack(self, player: np.ndarray, board: np.ndarray):
+		return self.get_key(player, self.get_mask(board))
+
+	def unpack(self, key: int):
+		config, mask = divmod(int(key), self.mask_count)
+		return [list(block) for block in self.configs[config]], self.get_bridges(mask)
+	# endregion
+
+	def add_config(self, config: Tuple[Tuple[int, int], Tuple[int, int]]):
+		self.config_index[config] = len(self.configs)
+		self.configs.append(config)
+
+	def enumerate_configs(self, state: State):
+		self.configs = []
+		self.config_index = {}
+		height, width = state.board.shape
+		cells = [(x, y) for y in range(height) for x in range(width) if not state.is_empty_floor(x, y)]
+
+		for (x, y) in cells:
+			for block2 in [(x, y), (x + 1, y), (x, y + 1)]:
+				if state.is_valid(np.array([(x, y), block2])):
+					self.add_config(((x, y), block2))
+
+		if state.teleporter:
+			# split blocks can only appear after a teleport
+			for block1 in cells:
+				for block2 in cells:
+					if State.get_direction(np.array([block1, block2])) == Direction.none:
+						self.add_config((block1, block2))
+
+	def load_configs(self, state: State):
+		# a configuration is kept if it is valid with every bridge on
+		player, board = state.player, np.copy(state.board)
+		state.load_state(player, self.get_bridges(self.mask_count - 1))
+		self.enumerate_configs(state)
+		state.board, state.player = board, player
+
+	def build(self, state: State):
+		self.load_configs(state)
+		self.successors = np.full((self.size, len(actions)), -1, dtype=np.int32)
+		self.goal = np.zeros(self.size, dtype=bool)
+		self.expand(state, np.arange(self.size))
+
+	# Fills the rows of the given keys with State's own move rules, one bridge mask at a time
+	def expand(self, state: State, keys: np.ndarray):
+		player, board, degree = state.player, np.copy(state.board), state.degree
+
+		configs, masks = np.divmod(keys, self.mask_count)
+		for mask in np.unique(masks).tolist():
+			state.load_state(player, self.get_bridges(mask))
+			for index in configs[masks == mask].tolist():
+				key = index * self.mask_count + mask
+				state.player = np.array(self.configs[index])
+				# a switch may pull a bridge from under the block; State keeps moving from there,
+				# so such states are expanded like any other
+				self.goal[key] = state.check_goal(state.player, state.board)
+				self.successors[key] = -1
+				if self.goal[key]:
+					continue
+
+				split = State.get_direction(state.player) == Direction.none
+				for column, action in enumerate(actions):
+					if action == 'swap' and not split:
+						continue
+					result = state.next_state(action)
+					if result is not None:
+						self.successors[key, column] = self.pack(*result)
+
+		state.board, state.player, state.degree = board, player, degree
+
+	# region Incremental
+	def get_changed_cells(self, state: State):
+		changed = {(x, y) for y, x in zip(*np.nonzero(self.board != state.board))}
+		for trigger in set(self.teleporter) | set(state.teleporter):
+			if self.teleporter.get(trigger) != state.teleporter.get(trigger):
+				# a trigger whose destinations moved behaves differently without its own tile changing
+				changed |= {cell for cell, features in state.switches.items() if trigger in features}
+		return changed
+
+	# Re-compiles the stage after an edit, recomputing only the rows of configurations that have
+	# an edited cell within two cells of a half, the furthest any move looks. Returns the old key of
+	# every new key (-1 for new configurations) and the recomputed keys, or None when the shape or
+	# the bridges changed and the stage has to be compiled from scratch.
+	def update(self, state: State):
+		if state.board.shape != self.board.shape or list(state.bridges) != list(self.bridges):
+			return None
+
+		changed = self.get_changed_cells(state)
+		near = {(x + dx, y + dy) for (x, y) in changed for dx in range(-2, 3) for dy in range(-2, 3)
+				if abs(dx) + abs(dy) <= 2}
+
+		old_index = self.config_index
+		old_successors, old_goal = self.successors, self.goal
+		self.bridges, self.teleporter, self.board = state.bridges, state.teleporter, np.copy(state.board)
+		self.load_configs(state)
+
+		old_to_new = np.full(len(old_index), -1, dtype=np.int64)
+		new_to_old = np.full(len(self.configs), -1, dtype=np.int64)
+		touched = np.zeros(len(self.configs), dtype=bool)
+		for index, config in enumerate(self.configs):
+			touched[index] = config[0] in near or config[1] in near
+			if config in old_index:
+				new_to_old[index] = old_index[config]
+				old_to_new[old_index[config]] = index
+
+		masks = np.tile(np.arange(self.mask_count), len(self.configs))
+		old_keys = np.repeat(new_to_old, self.mask_count) * self.mask_count + masks
+		old_keys[np.repeat(new_to_old < 0, self.mask_count)] = -1
+		kept = (old_keys >= 0) & ~np.repeat(touched, self.mask_count)
+
+		rows = old_successors[old_keys[kept]].astype(np.int64)
+		configs = np.where(rows >= 0, old_to_new[np.maximum(rows, 0) // self.mask_count], 0)
+		# a kept row moving into a removed configuration is recomputed as well
+		removed = ((rows >= 0) & (configs < 0)).any(axis=1)
+		kept[np.flatnonzero(kept)[removed]] = False
+		rows, configs = rows[~removed], configs[~removed]
+
+		self.successors = np.full((self.size, len(actions)), -1, dtype=np.int32)
+		self.goal = np.zeros(self.size, dtype=bool)
+		self.successors[kept] = np.where(rows >= 0, configs * self.mask_count + rows % self.mask_count, -1)
+		self.goal[kept] = old_goal[old_keys[kept]]
+
+		recomputed = np.flatnonzero(~kept)
+		self.expand(state, recomputed)
+		self.start = self.pack(state.player, state.board)
+		return old_keys, recomputed
+	# endregion
+
+	def predecessors(self):
+		# reverse edges in CSR form: sources[offsets[key]:offsets[key + 1]] all move into key
+		sources, columns = np.nonzero(self.successors >= 0)
+		targets = self.successors[sources, columns]
+		order = np.argsort(targets, kind='stable')
+		offsets = np.zeros(self.size + 1, dtype=np.int64)
+		np.cumsum(np.bincount(targets, minlength=self.size), out=offsets[1:])
+		return sources[order].astype(np.int32), offsets
+
+	def next_states(self, key: int) -> List[Tuple[str, int]]:
+		return [(actions[column], int(target)) for column, target in enumerate(self.successors[key]) if target >= 0]
@@ -1,4 +1,46 @@
 # coding=utf-8
+import importlib.util
+import sys
+import time
+
+# every move, in the order replay files and packed parents store them as numbers
+actions = ['up', 'down', 'left', 'right', 'swap']
+
+
+# Module that is only really imported once one of its attributes is used
+def lazy_import(name: str):
+	if name in sys.modules:
+		return sys.modules[name]
+	spec = importlib.util.find_spec(name)
+	spec.loader = importlib.util.LazyLoader(spec.loader)
+	module = importlib.util.module_from_spec(spec)
+	sys.modules[name] = module
+	spec.loader.exec_module(module)
+	return module
+
+
+class PhaseTimer:
+	# Milliseconds between consecutive marks, printed as a startup report
+	def __init__(self, start: float = None, enabled=True):
+		self.enabled = enabled
+		self.start = time.perf_counter() if start is None else start
+		self.last = self.start
+		self.phases = []
+
+	def mark(self, phase: str):
+		if self.enabled:
+			now = time.perf_counter()
+			self.phases.append((phase, (now - self.last) * 1000))
+			self.last = now
+
+	def report(self):
+		if self.enabled and self.phases:
+			for phase, total in self.phases:
+				print('{0:<20}{1:>10.3f} ms'.format(phase, total))
+			print('{0:<20}{1:>10.3f} ms'.format('Total', (self.last - self.start) * 1000))
+			self.phases = []
+
+
 class Direction:
 	standing = 0
 	laying_x = 1
@@ -20,3 +62,8 @@ class Method:
 	depth_first_search = 0
 	breadth_first_search = 1
 	hill_climbing = 2
+	distance_map = 3
+	iterative_deepening = 4
+	parallel_breadth_first_search = 5
+	compiled_breadth_first_search = 6
+	approximate_breadth_first_search = 7